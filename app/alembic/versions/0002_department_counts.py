@@ -0,0 +1,38 @@
+"""department contact counts
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('departments', sa.Column('contacts_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('departments', sa.Column('subtree_contacts_count', sa.Integer(), nullable=False, server_default='0'))
+    op.execute("""
+        UPDATE departments d SET contacts_count = c.cnt
+        FROM (SELECT department_id, count(*) AS cnt FROM contacts WHERE is_archived = false GROUP BY department_id) c
+        WHERE c.department_id = d.id
+    """)
+    op.execute("""
+        WITH RECURSIVE tree AS (
+            SELECT id AS root_id, id FROM departments
+            UNION ALL
+            SELECT t.root_id, d.id FROM departments d JOIN tree t ON d.parent_id = t.id
+        )
+        UPDATE departments d SET subtree_contacts_count = s.total
+        FROM (SELECT tree.root_id, sum(dep.contacts_count) AS total FROM tree JOIN departments dep ON dep.id = tree.id GROUP BY tree.root_id) s
+        WHERE s.root_id = d.id
+    """)
+
+
+def downgrade():
+    op.drop_column('departments', 'subtree_contacts_count')
+    op.drop_column('departments', 'contacts_count')
@@ -0,0 +1,50 @@
+"""secondary indexes for hot queries
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+TRGM_INDEXES = [
+    ('ix_contacts_full_name_trgm', 'contacts', 'full_name'),
+    ('ix_departments_name_trgm', 'departments', 'name'),
+    ('ix_phones_number_trgm', 'phones', 'number'),
+]
+
+
+def has_trgm():
+    bind = op.get_bind()
+    return bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")).scalar() is not None
+
+
+def upgrade():
+    op.create_index('ix_departments_parent_id', 'departments', ['parent_id'])
+    op.create_index('ix_contacts_department_id', 'contacts', ['department_id', 'full_name'])
+    op.create_index('ix_contacts_name_id', 'contacts', ['full_name', 'id'])
+    op.create_index('ix_contacts_active_name_id', 'contacts', ['full_name', 'id'], postgresql_where=sa.text('is_archived = false'))
+    # contact_id уже покрыт uq_contact_phone (contact_id, phone_id)
+    op.create_index('ix_contact_phones_phone_id', 'contact_phones', ['phone_id', 'contact_id'])
+    op.create_index('ix_audit_log_created_at', 'audit_log', ['created_at'])
+    # Поиск ILIKE '%q%' без триграмм всегда читает таблицу целиком
+    if has_trgm():
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, table, column in TRGM_INDEXES:
+            op.create_index(name, table, [column], postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for name, table, _ in TRGM_INDEXES:
+        op.execute(f'DROP INDEX IF EXISTS {name}')
+    op.drop_index('ix_audit_log_created_at', 'audit_log')
+    op.drop_index('ix_contact_phones_phone_id', 'contact_phones')
+    op.drop_index('ix_contacts_active_name_id', 'contacts')
+    op.drop_index('ix_contacts_name_id', 'contacts')
+    op.drop_index('ix_contacts_department_id', 'contacts')
+    op.drop_index('ix_departments_parent_id', 'departments')
@@ -0,0 +1,159 @@
+import json
+import os
+import select
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from app.config import settings
+
+CHANNEL = 'phone_directly_cache'
+ALL = '*'
+RECONNECT_DELAY = 5
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_handlers = defaultdict(list)
+_stop = threading.Event()
+_connected = threading.Event()
+_thread = None
+
+
+def on_invalidate(*entities):
+    def decorator(func):
+        for entity in entities:
+            _handlers[entity].append(func)
+        return func
+    return decorator
+
+
+def dispatch(entity: str, entity_id: int | None = None):
+    if entity == ALL:
+        handlers = {h for hs in _handlers.values() for h in hs}
+    else:
+        handlers = _handlers.get(entity, [])
+    for handler in handlers:
+        try:
+            handler(entity, entity_id)
+        except Exception as e:
+            print(f"cache invalidation failed for {entity}: {e}")
+
+
+def is_live() -> bool:
+    return _connected.is_set()
+
+
+def publish(db: Session, entity: str, entity_id: int | None = None):
+    # Вызывать до commit записи: NOTIFY уходит в той же транзакции, что и данные,
+    # а локальные кэши сбрасываются после неё
+    db.execute(text(
+        "SELECT pg_notify(:channel, json_build_object("
+        "'entity', CAST(:entity AS text), 'id', CAST(:entity_id AS integer), "
+        "'origin', CAST(:origin AS text))::text)"
+    ), {'channel': CHANNEL, 'entity': entity, 'entity_id': entity_id, 'origin': ORIGIN})
+    db.info.setdefault('cache_events', []).append((entity, entity_id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_committed(session: Session):
+    for entity, entity_id in session.info.pop('cache_events', []):
+        dispatch(entity, entity_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_rolled_back(session: Session):
+    session.info.pop('cache_events', None)
+
+
+class LocalCache:
+    # Пока слушатель подключён, значения живут до сообщения об инвалидации.
+    # Без него другие воркеры не узнают об изменениях, поэтому значение живёт
+    # не дольше fallback_ttl секунд, а при 0 не кэшируется вовсе.
+
+    def __init__(self, *entities, fallback_ttl: float = 0):
+        self._data = {}
+        self._generation = 0
+        self._lock = threading.RLock()
+        self.fallback_ttl = fallback_ttl
+        on_invalidate(*entities)(lambda entity, entity_id: self.clear())
+
+    def _fresh(self, item) -> bool:
+        return is_live() or time.monotonic() - item[1] < self.fallback_ttl
+
+    def get(self, key, loader):
+        item = self._data.get(key)
+        if item is not None and self._fresh(item):
+            return item[0]
+        if not is_live() and not self.fallback_ttl:
+            return loader()
+        # Загрузка под блокировкой: при одновременных промахах значение строится один раз
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self._fresh(item):
+                return item[0]
+            generation = self._generation
+            value = loader()
+            # Инвалидация во время загрузки: значение могло быть прочитано до изменения
+            if generation == self._generation:
+                self._data[key] = (value, time.monotonic())
+            return value
+
+    def clear(self):
+        self._generation += 1
+        self._data = {}
+
+
+def _handle(payload: str):
+    try:
+        message = json.loads(payload)
+    except ValueError:
+        return
+    if message.get('origin') == ORIGIN:
+        return
+    dispatch(message.get('entity'), message.get('id'))
+
+
+def _listen():
+    while not _stop.is_set():
+        conn = None
+        try:
+            conn = psycopg2.connect(settings.DATABASE_URL)
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            conn.cursor().execute(f'LISTEN {CHANNEL}')
+            # Пока соединения не было, события могли потеряться — сбрасываем всё
+            dispatch(ALL)
+            _connected.set()
+            while not _stop.is_set():
+                if select.select([conn], [], [], RECONNECT_DELAY) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _handle(conn.notifies.pop(0).payload)
+        except Exception as e:
+            print(f"cache listener error: {e}")
+            _connected.clear()
+            _stop.wait(RECONNECT_DELAY)
+        finally:
+            _connected.clear()
+            if conn is not None:
+                conn.close()
+
+
+def start_listener():
+    global _thread
+    if _thread is not None or not settings.CACHE_BUS_ENABLED:
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_listen, name='cache-bus', daemon=True)
+    _thread.start()
+
+
+def stop_listener():
+    global _thread
+    _stop.set()
+    _connected.clear()
+    _thread = None
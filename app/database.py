@@ -1,9 +1,19 @@
+import time
+from fastapi import Request
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from app.config import settings
 
+READ_PIN_COOKIE = 'read_primary_until'
+
 engine = create_engine(settings.DATABASE_URL, echo=False, pool_pre_ping=True)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+if settings.DATABASE_READ_URL:
+    read_engine = create_engine(settings.DATABASE_READ_URL, echo=False, pool_pre_ping=True)
+    ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False)
+else:
+    read_engine = engine
+    ReadSessionLocal = SessionLocal
 Base = declarative_base()
 
 
@@ -13,3 +23,20 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def is_pinned_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def get_read_db(request: Request):
+    # После записи пользователь какое-то время читает с основной БД, чтобы видеть свои изменения
+    factory = SessionLocal if is_pinned_to_primary(request) else ReadSessionLocal
+    db = factory()
+    try:
+        yield db
+    finally:
+        db.close()
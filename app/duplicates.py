@@ -0,0 +1,95 @@
+import random
+import zlib
+import numpy as np
+from collections import defaultdict
+from itertools import combinations
+from sqlalchemy.orm import Session
+from app.models import Contact, ContactPhone, Department
+from app.search_index import tokenize
+
+# MinHash по триграммам: BANDS полос по ROWS хешей, пары с похожими именами попадают в общую корзину
+BANDS = 8
+ROWS = 2
+MAX_BLOCK_SIZE = 50
+NAME_THRESHOLD = 0.6
+SHARED_PHONE_NAME_THRESHOLD = 0.3
+REPORT_LIMIT = 200
+PRIME = (1 << 31) - 1
+_rng = random.Random(20261019)
+COEF_A = np.array([_rng.randrange(1, PRIME) for _ in range(BANDS * ROWS)], dtype=np.uint64)[:, None]
+COEF_B = np.array([_rng.randrange(PRIME) for _ in range(BANDS * ROWS)], dtype=np.uint64)[:, None]
+
+
+def name_key(full_name: str) -> str:
+    return ' '.join(sorted(tokenize(full_name)))
+
+
+def trigrams(key: str):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def minhash_bands(grams):
+    if not grams:
+        return []
+    hashes = np.fromiter((zlib.crc32(g.encode('utf-8')) % PRIME for g in grams), dtype=np.uint64, count=len(grams))
+    signature = ((COEF_A * hashes + COEF_B) % PRIME).min(axis=1).reshape(BANDS, ROWS)
+    return [(band, row.tobytes()) for band, row in enumerate(signature)]
+
+
+def jaccard(a, b) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def find_duplicates(db: Session, limit: int = REPORT_LIMIT):
+    contacts = db.query(Contact.id, Contact.full_name, Contact.department_id).filter(Contact.is_archived == False).all()
+    phones = defaultdict(set)
+    for contact_id, phone_id in db.query(ContactPhone.contact_id, ContactPhone.phone_id).join(Contact).filter(Contact.is_archived == False):
+        phones[contact_id].add(phone_id)
+    departments = dict(db.query(Department.id, Department.name).all())
+    return duplicate_pairs(contacts, phones, departments, limit)
+
+
+def duplicate_pairs(contacts, phones, departments, limit: int = REPORT_LIMIT):
+    # contacts — строки с id, full_name, department_id; phones — {contact_id: {phone_id}}
+    grams = {}
+    blocks = defaultdict(list)
+    for c in contacts:
+        key = name_key(c.full_name)
+        grams[c.id] = trigrams(key)
+        blocks[('name', key)].append(c.id)
+        for phone_id in phones.get(c.id, ()):
+            blocks[('phone', phone_id)].append(c.id)
+        for band in minhash_bands(grams[c.id]):
+            blocks[('minhash',) + band].append(c.id)
+
+    # Сравниваем только внутри корзин; слишком крупные корзины ничего не различают и пропускаются
+    candidates = set()
+    for ids in blocks.values():
+        if 1 < len(ids) <= MAX_BLOCK_SIZE:
+            candidates.update(combinations(sorted(ids), 2))
+
+    by_id = {c.id: c for c in contacts}
+    pairs = []
+    for a, b in candidates:
+        score = jaccard(grams[a], grams[b])
+        shared = phones.get(a, set()) & phones.get(b, set())
+        if score < NAME_THRESHOLD and not (shared and score >= SHARED_PHONE_NAME_THRESHOLD):
+            continue
+        reasons = []
+        if grams[a] == grams[b]:
+            reasons.append('одинаковое ФИО')
+        else:
+            reasons.append(f'похожее ФИО ({score:.0%})')
+        if shared:
+            reasons.append(f'общих номеров: {len(shared)}')
+        pairs.append({
+            'a': {'id': a, 'full_name': by_id[a].full_name, 'department': departments.get(by_id[a].department_id)},
+            'b': {'id': b, 'full_name': by_id[b].full_name, 'department': departments.get(by_id[b].department_id)},
+            'score': score + (0.5 if shared else 0),
+            'reasons': reasons,
+        })
+    pairs.sort(key=lambda p: p['score'], reverse=True)
+    return pairs[:limit]
@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+from xml.sax.saxutils import escape
+
+PHONE_TYPE_LABELS = {'city': 'Городской', 'internal': 'Внутренний', 'ip': 'IP'}
+# CiscoIPPhoneDirectory показывает не больше 32 записей, остальное — следующими страницами
+CISCO_PAGE_SIZE = 32
+# Ссылка «Далее» зависит от хоста запроса; обычно он один, предел защищает от подставных Host
+CISCO_MAX_BUILT_PAGES = 256
+
+
+class Feed:
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9)
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self.gzip_etag = self.etag[:-1] + '-gz"'
+        self.media_type = media_type
+
+
+def contact_phones(contact):
+    return [(cp.phone.type, cp.phone.number) for cp in sorted(contact.phones, key=lambda cp: cp.sort_order or 0)]
+
+
+def render_yealink(contacts, title: str) -> bytes:
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<YealinkIPPhoneDirectory>', f'<Title>{escape(title)}</Title>']
+    for c in contacts:
+        phones = contact_phones(c)
+        if not phones:
+            continue
+        lines.append('<DirectoryEntry>')
+        lines.append(f'<Name>{escape(c.full_name)}</Name>')
+        for _, number in phones:
+            lines.append(f'<Telephone>{escape(number)}</Telephone>')
+        lines.append('</DirectoryEntry>')
+    lines.append('</YealinkIPPhoneDirectory>')
+    return '\n'.join(lines).encode('utf-8')
+
+
+class CiscoDirectory:
+    # Записи режутся на страницы один раз. Ссылка «Далее» должна быть абсолютной, а хост
+    # берётся из запроса, поэтому готовая страница кэшируется по паре (номер, ссылка)
+    media_type = 'text/xml; charset=utf-8'
+
+    def __init__(self, contacts, title: str):
+        entries = []
+        for c in contacts:
+            # У Cisco в записи только один Telephone — каждый номер отдельной строкой
+            for ptype, number in contact_phones(c):
+                name = f'{c.full_name} ({PHONE_TYPE_LABELS.get(ptype, ptype)})'
+                entries.append(f'<DirectoryEntry><Name>{escape(name)}</Name><Telephone>{escape(number)}</Telephone></DirectoryEntry>')
+        self.title = title
+        self.pages = [entries[i:i + CISCO_PAGE_SIZE] for i in range(0, len(entries), CISCO_PAGE_SIZE)] or [[]]
+        self._built = {}
+
+    def page(self, number: int, next_url: str | None) -> Feed:
+        feed = self._built.get((number, next_url))
+        if feed is None:
+            if len(self._built) >= CISCO_MAX_BUILT_PAGES:
+                self._built = {}
+            feed = self._built[(number, next_url)] = self._render_page(number, next_url)
+        return feed
+
+    def _render_page(self, number: int, next_url: str | None) -> Feed:
+        lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<CiscoIPPhoneDirectory>', f'<Title>{escape(self.title)}</Title>',
+                 f'<Prompt>Стр. {number} из {len(self.pages)}</Prompt>']
+        lines += self.pages[number - 1]
+        if next_url:
+            # Свои softkey заменяют стандартные, поэтому Dial/EditDial/Exit перечислены явно
+            softkeys = [('Набрать', 'SoftKey:Dial'), ('Изменить', 'SoftKey:EditDial'), ('Выход', 'SoftKey:Exit'), ('Далее', next_url)]
+            for position, (name, url) in enumerate(softkeys, 1):
+                lines.append(f'<SoftKeyItem><Name>{name}</Name><URL>{escape(url)}</URL><Position>{position}</Position></SoftKeyItem>')
+        lines.append('</CiscoIPPhoneDirectory>')
+        return Feed('\n'.join(lines).encode('utf-8'), self.media_type)
+
+
+def vcard_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace(',', '\\,').replace(';', '\\;').replace('\n', '\\n')
+
+
+def render_vcard(contacts, title: str) -> bytes:
+    lines = []
+    for c in contacts:
+        lines += ['BEGIN:VCARD', 'VERSION:3.0', f'FN:{vcard_value(c.full_name)}', f'N:{vcard_value(c.full_name)};;;;', f'ORG:{vcard_value(c.department.name)}']
+        for ptype, number in contact_phones(c):
+            tel_type = 'WORK,VOICE' if ptype == 'city' else 'WORK'
+            lines.append(f'TEL;TYPE={tel_type}:{vcard_value(number)}')
+        lines.append('END:VCARD')
+    return ''.join(line + '\r\n' for line in lines).encode('utf-8')
+
+
+FEED_FORMATS = {
+    'yealink.xml': (render_yealink, 'application/xml; charset=utf-8'),
+    'cisco.xml': (CiscoDirectory, CiscoDirectory.media_type),
+    'contacts.vcf': (render_vcard, 'text/vcard; charset=utf-8'),
+}
+
+
+def build_feed(name: str, contacts, title: str):
+    render, media_type = FEED_FORMATS[name]
+    if render is CiscoDirectory:
+        return CiscoDirectory(contacts, title)
+    return Feed(render(contacts, title), media_type)
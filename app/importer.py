@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import chain, islice
+import pandas as pd
+from app.config import settings
+
+COLUMNS = ['DepartmentPath', 'FullName', 'PhonesCity', 'PhonesInternal', 'PhonesIP', 'Archived']
+PHONE_COLUMNS = [('PhonesCity', 'city'), ('PhonesInternal', 'internal'), ('PhonesIP', 'ip')]
+DEFAULT_DEPARTMENT = 'Импортированные'
+
+
+def iter_csv_chunks(fileobj, chunksize: int):
+    yield from pd.read_csv(fileobj, chunksize=chunksize, dtype=str, keep_default_na=False)
+
+
+def iter_xlsx_chunks(fileobj, chunksize: int):
+    from openpyxl import load_workbook
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(h) if h is not None else '' for h in next(rows, [])]
+        width = len(header)
+        batch = []
+        for row in rows:
+            values = ['' if v is None else str(v) for v in row[:width]]
+            batch.append(values + [''] * (width - len(values)))
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        wb.close()
+
+
+def split_list(series: pd.Series, sep: str) -> pd.Series:
+    cleaned = series.str.replace(rf'\s*{sep}\s*', sep, regex=True).str.strip(f'{sep} ')
+    return cleaned.str.split(sep).map(lambda parts: [p for p in parts if p])
+
+
+def normalize_chunk(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.reindex(columns=COLUMNS, fill_value='').fillna('').astype(str)
+    df = df.apply(lambda col: col.str.strip())
+    df = df.mask(df.apply(lambda col: col.str.lower()) == 'nan', '')
+    out = pd.DataFrame(index=df.index)
+    out['full_name'] = df['FullName']
+    out['path_parts'] = split_list(df['DepartmentPath'], '/').map(lambda parts: parts or [DEFAULT_DEPARTMENT])
+    out['archived'] = pd.to_numeric(df['Archived'], errors='coerce').fillna(0).astype(int) != 0
+    for col, _ in PHONE_COLUMNS:
+        out[col] = split_list(df[col], ';')
+    return out
+
+
+def validate_row(row_no: int, full_name: str, path_parts, phones):
+    if not full_name:
+        return f"Строка {row_no}: не указано ФИО"
+    if len(full_name) > 255:
+        return f"Строка {row_no}: ФИО длиннее 255 символов"
+    for part in path_parts:
+        if len(part) > 255:
+            return f"Строка {row_no}: название отдела длиннее 255 символов"
+    for _, num in phones:
+        if len(num) > 50:
+            return f"Строка {row_no}: номер {num[:50]}… длиннее 50 символов"
+    return None
+
+
+def parse_chunk(df: pd.DataFrame, start: int):
+    norm = normalize_chunk(df)
+    rows = []
+    errors = []
+    for i, (full_name, path_parts, archived, city, internal, ip) in enumerate(
+            norm[['full_name', 'path_parts', 'archived', 'PhonesCity', 'PhonesInternal', 'PhonesIP']].itertuples(index=False, name=None)):
+        row_no = start + i + 1
+        phones = [('city', n) for n in city] + [('internal', n) for n in internal] + [('ip', n) for n in ip]
+        err = validate_row(row_no, full_name, path_parts, phones)
+        if err:
+            errors.append(err)
+            continue
+        rows.append({'row': row_no, 'full_name': full_name, 'path_parts': path_parts, 'archived': bool(archived), 'phones': phones})
+    return rows, errors
+
+
+def parse_import(fileobj, ext: str):
+    chunksize = settings.IMPORT_CHUNK_SIZE
+    chunks = iter_csv_chunks(fileobj, chunksize) if ext == '.csv' else iter_xlsx_chunks(fileobj, chunksize)
+    workers = settings.IMPORT_WORKERS or os.cpu_count() or 1
+    head = list(islice(chunks, 2))
+    chunks = chain(head, chunks)
+    # Файл из одного чанка быстрее разобрать на месте, чем поднимать пул
+    if workers <= 1 or len(head) < 2:
+        start = 0
+        for df in chunks:
+            yield parse_chunk(df, start)
+            start += len(df)
+        return
+    # forkserver, а не fork: воркер uvicorn уже держит потоки (cache-bus, threadpool),
+    # и форк с чужими захваченными блокировками может зависнуть.
+    # Не больше двух чанков на процесс в полёте — память ограничена независимо от размера файла
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver')) as pool:
+        pending = deque()
+        start = 0
+        for df in chunks:
+            pending.append(pool.submit(parse_chunk, df, start))
+            start += len(df)
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
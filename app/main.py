@@ -1,20 +1,30 @@
 import os
+import json
+import time
+from collections import Counter
 from datetime import datetime
+from urllib.parse import urlencode
 from fastapi import FastAPI, Request, Depends, Form, UploadFile, File, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from sqlalchemy import or_, func
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import or_, and_, func, select, update, delete, case, union
 import pandas as pd
 
 from app.config import settings
-from app.database import get_db, engine, Base, SessionLocal
+from app.database import get_db, get_read_db, engine, Base, SessionLocal, READ_PIN_COOKIE
 from app.models import User, Department, Contact, Phone, ContactPhone, Banner, Setting, AuditLog
 from app.utils import verify_password, get_password_hash, sign_session
+from app.search_index import suggest_index
+from app.cache_bus import LocalCache, is_live, on_invalidate, publish, start_listener, stop_listener
+from app.feeds import FEED_FORMATS, CiscoDirectory, build_feed
+from app.importer import parse_import
+from app.duplicates import find_duplicates
 
 app = FastAPI()
 app.state.session_cookie = settings.SESSION_COOKIE_NAME
+app.state.seeded = False
 
 Base.metadata.create_all(bind=engine)
 
@@ -25,6 +35,38 @@ app.mount('/static', StaticFiles(directory=os.path.join(os.path.dirname(__file__
 app.mount('/uploads', StaticFiles(directory=settings.UPLOAD_DIR), name='uploads')
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), 'templates'))
 
+settings_cache = LocalCache('setting')
+user_cache = LocalCache('user')
+feed_cache = LocalCache('contact', 'department', 'import', fallback_ttl=settings.CACHE_FALLBACK_TTL)
+duplicates_cache = LocalCache('contact', 'department', 'import', fallback_ttl=settings.CACHE_FALLBACK_TTL)
+
+
+@app.on_event('startup')
+def start_cache_bus():
+    start_listener()
+
+
+@app.on_event('shutdown')
+def stop_cache_bus():
+    stop_listener()
+
+
+@on_invalidate('contact', 'import')
+def refresh_suggest_index(entity: str, entity_id: int | None):
+    # Обработчик идёт после commit и в потоке слушателя, поэтому полную пересборку не делаем:
+    # индекс помечается устаревшим и пересобирается при следующем /api/suggest.
+    # Новый отдел пуст, а переименования отделов нет — события 'department' индекс не трогают.
+    if not (entity == 'contact' and entity_id):
+        suggest_index.invalidate()
+        return
+    if not suggest_index.ready:
+        return
+    db = SessionLocal()
+    try:
+        suggest_index.refresh_contacts(db, [entity_id])
+    finally:
+        db.close()
+
 
 def seed(db: Session):
     if not db.query(User).first():
@@ -43,6 +85,8 @@ def seed(db: Session):
         c1 = Contact(full_name='Иван Петров', department=root)
         c2 = Contact(full_name='Мария Смирнова', department=dev)
         db.add_all([c1, c2])
+        adjust_department_counts(db, root.id, 1)
+        adjust_department_counts(db, dev.id, 1)
         db.commit()
         p1 = Phone(type='city', number='123-45-67')
         p2 = Phone(type='internal', number='101')
@@ -64,16 +108,20 @@ async def add_user_to_request(request: Request, call_next):
     response = Response('Internal error', status_code=500)
     try:
         db = SessionLocal()
-        seed(db)
+        if not app.state.seeded:
+            seed(db)
+            app.state.seeded = True
         token = request.cookies.get(app.state.session_cookie)
         request.state.current_user = None
-        if token:
+        # Публичное API не зависит от пользователя — не ходим в БД на каждый запрос
+        if token and not request.url.path.startswith('/api/'):
             from app.utils import unsign_session
             data = unsign_session(token)
             if data:
-                user = db.query(User).filter(User.id == data.get('user_id'), User.is_active == True).first()
-                request.state.current_user = user
+                request.state.current_user = user_cache.get(data.get('user_id'), lambda: load_session_user(db, data.get('user_id')))
         response = await call_next(request)
+        if request.method == 'POST' and settings.DATABASE_READ_URL:
+            response.set_cookie(READ_PIN_COOKIE, str(time.time() + settings.READ_PIN_SECONDS), max_age=settings.READ_PIN_SECONDS, httponly=True)
     except Exception as e:
         print(e)
         raise e
@@ -84,6 +132,13 @@ async def add_user_to_request(request: Request, call_next):
 
 # Helpers
 
+def load_session_user(db: Session, user_id: int):
+    user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    if user:
+        db.expunge(user)
+    return user
+
+
 def get_department_tree(db: Session):
     departments = db.query(Department).filter(Department.is_active == True).order_by(Department.parent_id, Department.sort_order).all()
     tree = {}
@@ -96,11 +151,41 @@ def get_department_tree(db: Session):
     return tree
 
 
-def collect_department_ids(node):
-    ids = [node.id]
-    for child in node.children:
-        ids.extend(collect_department_ids(child))
-    return ids
+def department_subtree_ids(db: Session, dept_id: int):
+    tree = select(Department.id).where(Department.id == dept_id).cte('subtree', recursive=True)
+    tree = tree.union_all(select(Department.id).where(Department.parent_id == tree.c.id))
+    return [row[0] for row in db.execute(select(tree.c.id))]
+
+
+def adjust_department_counts(db: Session, dept_id: int, delta: int):
+    # Счётчики отдела и всех его предков меняются одним UPDATE; commit делает вызывающий код
+    if not delta:
+        return
+    ancestors = select(Department.id, Department.parent_id).where(Department.id == dept_id).cte('ancestors', recursive=True)
+    ancestors = ancestors.union_all(select(Department.id, Department.parent_id).where(Department.id == ancestors.c.parent_id))
+    db.execute(
+        update(Department)
+        .where(Department.id.in_(select(ancestors.c.id)))
+        .values(
+            subtree_contacts_count=Department.subtree_contacts_count + delta,
+            contacts_count=Department.contacts_count + case((Department.id == dept_id, delta), else_=0),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def set_contact_archived(db: Session, contact_id: int, archived: bool):
+    # Условный UPDATE: из двух одновременных запросов строку вернёт только один, и счётчик сдвинется один раз
+    dept_id = db.execute(
+        update(Contact)
+        .where(Contact.id == contact_id, Contact.is_archived == (not archived))
+        .values(is_archived=archived)
+        .returning(Contact.department_id)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if dept_id is not None:
+        adjust_department_counts(db, dept_id, -1 if archived else 1)
+    return dept_id is not None
 
 
 def log_action(db: Session, user_id: int, action: str, entity: str, entity_id: int, diff_json: str = None, ip: str = None):
@@ -109,8 +194,10 @@ def log_action(db: Session, user_id: int, action: str, entity: str, entity_id: i
 
 
 def max_contacts_per_phone(db: Session) -> int:
-    setting = db.query(Setting).filter_by(key='max_contacts_per_phone').first()
-    return int(setting.value) if setting else settings.MAX_CONTACTS_PER_PHONE_DEFAULT
+    def load():
+        setting = db.query(Setting).filter_by(key='max_contacts_per_phone').first()
+        return int(setting.value) if setting else settings.MAX_CONTACTS_PER_PHONE_DEFAULT
+    return settings_cache.get('max_contacts_per_phone', load)
 
 
 def check_phone_limit(db: Session, phone: Phone, contact_ids_to_link):
@@ -124,17 +211,25 @@ def check_phone_limit(db: Session, phone: Phone, contact_ids_to_link):
 
 # Public routes
 @app.get('/', response_class=HTMLResponse)
-def public_index(request: Request, db: Session = Depends(get_db), dept_id: int | None = None, q: str | None = None):
+def public_index(request: Request, db: Session = Depends(get_read_db), dept_id: int | None = None, q: str | None = None):
     tree = get_department_tree(db)
-    contacts_query = db.query(Contact).join(Department).filter(Contact.is_archived == False)
+    contacts_query = db.query(Contact).options(
+        joinedload(Contact.department),
+        selectinload(Contact.phones).selectinload(ContactPhone.phone),
+    ).filter(Contact.is_archived == False)
     if dept_id:
-        dept = db.query(Department).get(dept_id)
-        if dept:
-            ids = collect_department_ids(dept)
+        ids = department_subtree_ids(db, dept_id)
+        if ids:
             contacts_query = contacts_query.filter(Contact.department_id.in_(ids))
     if q:
         q_like = f"%{q}%"
-        contacts_query = contacts_query.filter(or_(Contact.full_name.ilike(q_like), Department.name.ilike(q_like), Contact.id.in_(db.query(ContactPhone.contact_id).join(Phone).filter(Phone.number.ilike(q_like)))))
+        # UNION вместо OR по трём таблицам: каждая ветка идёт по своему индексу
+        matches = union(
+            select(Contact.id).where(Contact.full_name.ilike(q_like)),
+            select(Contact.id).join(Department).where(Department.name.ilike(q_like)),
+            select(ContactPhone.contact_id).join(Phone).where(Phone.number.ilike(q_like)),
+        )
+        contacts_query = contacts_query.filter(Contact.id.in_(matches))
     contacts = contacts_query.order_by(Contact.full_name).all()
     banners = {b.side: b for b in db.query(Banner).all()}
     return templates.TemplateResponse('public/index.html', {
@@ -147,6 +242,52 @@ def public_index(request: Request, db: Session = Depends(get_db), dept_id: int |
     })
 
 
+@app.get('/api/suggest')
+def api_suggest(db: Session = Depends(get_db), q: str = '', limit: int = 10):
+    # Индекс живёт до следующей записи, поэтому строится с основной БД: отстающая реплика закэшировалась бы как текущая.
+    # Сессия открывает соединение только при пересборке, обычный запрос в БД не ходит
+    suggest_index.ensure_ready(db, None if is_live() else settings.CACHE_FALLBACK_TTL)
+    return suggest_index.suggest(q, min(max(limit, 1), 50))
+
+
+def load_feed(db: Session, name: str, dept_id: int | None):
+    query = db.query(Contact).options(
+        joinedload(Contact.department),
+        selectinload(Contact.phones).selectinload(ContactPhone.phone),
+    ).filter(Contact.is_archived == False)
+    title = 'Телефонный справочник'
+    if dept_id:
+        # Исключение не попадает в кэш: несуществующие отделы не занимают память
+        dept = db.query(Department).get(dept_id)
+        if not dept:
+            raise HTTPException(status_code=404)
+        title = dept.name
+        query = query.filter(Contact.department_id.in_(department_subtree_ids(db, dept_id)))
+    return build_feed(name, query.order_by(Contact.full_name, Contact.id).all(), title)
+
+
+@app.get('/api/phonebook/{name}')
+def phonebook_feed(request: Request, name: str, db: Session = Depends(get_db), dept_id: int | None = None, page: int = 1):
+    # Строим с основной БД: инвалидация приходит с неё, а отстающая реплика закэшировала бы старую версию
+    if name not in FEED_FORMATS:
+        raise HTTPException(status_code=404)
+    dept_id = dept_id or None
+    feed = feed_cache.get((name, dept_id), lambda: load_feed(db, name, dept_id))
+    if isinstance(feed, CiscoDirectory):
+        if not 1 <= page <= len(feed.pages):
+            raise HTTPException(status_code=404)
+        next_url = str(request.url.include_query_params(page=page + 1)) if page < len(feed.pages) else None
+        feed = feed.page(page, next_url)
+    gzipped = 'gzip' in request.headers.get('accept-encoding', '')
+    etag = feed.gzip_etag if gzipped else feed.etag
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        return Response(feed.gzipped, media_type=feed.media_type, headers={**headers, 'Content-Encoding': 'gzip'})
+    return Response(feed.body, media_type=feed.media_type, headers=headers)
+
+
 # Auth
 @app.get('/admin/login', response_class=HTMLResponse)
 def login_page(request: Request):
@@ -180,15 +321,79 @@ def admin_dashboard(request: Request):
 
 
 # Contacts
+CONTACTS_PAGE_SIZE = 50
+
+
+def contacts_page_context(db: Session, q: str | None = None, dept_id: int | None = None, phone: str | None = None,
+                          status: str = 'active', after_name: str | None = None, after_id: int | None = None):
+    query = db.query(Contact).options(
+        joinedload(Contact.department),
+        selectinload(Contact.phones).selectinload(ContactPhone.phone),
+    )
+    if status == 'active':
+        query = query.filter(Contact.is_archived == False)
+    elif status == 'archived':
+        query = query.filter(Contact.is_archived == True)
+    if q:
+        query = query.filter(Contact.full_name.ilike(f"%{q}%"))
+    if dept_id:
+        query = query.filter(Contact.department_id.in_(department_subtree_ids(db, dept_id)))
+    if phone:
+        query = query.filter(Contact.id.in_(
+            select(ContactPhone.contact_id).join(Phone).where(Phone.number.ilike(f"%{phone}%"))
+        ))
+    if after_name is not None and after_id is not None:
+        query = query.filter(or_(Contact.full_name > after_name, and_(Contact.full_name == after_name, Contact.id > after_id)))
+    rows = query.order_by(Contact.full_name, Contact.id).limit(CONTACTS_PAGE_SIZE + 1).all()
+    contacts = rows[:CONTACTS_PAGE_SIZE]
+    filters = {'q': q or '', 'dept_id': dept_id, 'phone': phone or '', 'status': status}
+    filters_query = urlencode({k: v for k, v in filters.items() if v})
+    next_url = None
+    if len(rows) > CONTACTS_PAGE_SIZE:
+        cursor = urlencode({'after_name': contacts[-1].full_name, 'after_id': contacts[-1].id})
+        next_url = f'/admin/contacts?{filters_query}&{cursor}'
+    departments = db.query(Department.id, Department.name).order_by(Department.name).all()
+    return {
+        'contacts': contacts,
+        'departments': departments,
+        'filters': filters,
+        'filters_query': filters_query,
+        'first_url': f'/admin/contacts?{filters_query}',
+        'next_url': next_url,
+        'is_first_page': after_id is None,
+    }
+
+
+def optional_int(value) -> int | None:
+    # Пункт «Все отделы» отправляет dept_id= — это отсутствие фильтра, а не ошибка
+    value = str(value or '')
+    return int(value) if value.isdigit() else None
+
+
+def contacts_filters(request: Request):
+    # Формы списка передают фильтры в query string, чтобы ответ с ошибкой и редирект их сохраняли
+    params = request.query_params
+    return {
+        'q': params.get('q'),
+        'dept_id': optional_int(params.get('dept_id')),
+        'phone': params.get('phone'),
+        'status': params.get('status') or 'active',
+    }
+
+
+def contacts_redirect(request: Request):
+    params = {k: v for k, v in contacts_filters(request).items() if v}
+    return RedirectResponse('/admin/contacts?' + urlencode(params), status_code=302)
+
+
 @app.get('/admin/contacts', response_class=HTMLResponse)
-def contacts_list(request: Request, db: Session = Depends(get_db)):
+def contacts_list(request: Request, db: Session = Depends(get_read_db), q: str | None = None, dept_id: str | None = None,
+                  phone: str | None = None, status: str = 'active', after_name: str | None = None, after_id: int | None = None):
     user = request.state.current_user
     if not user or user.role not in ['admin', 'editor']:
         return RedirectResponse('/admin/login', status_code=302)
-    contacts = db.query(Contact).order_by(Contact.full_name).all()
-    departments = db.query(Department).all()
-    phones = db.query(Phone).all()
-    return templates.TemplateResponse('admin/contacts.html', {'request': request, 'contacts': contacts, 'departments': departments, 'phones': phones})
+    context = contacts_page_context(db, q, optional_int(dept_id), phone, status, after_name, after_id)
+    return templates.TemplateResponse('admin/contacts.html', {'request': request, **context})
 
 
 @app.post('/admin/contacts')
@@ -198,7 +403,9 @@ def create_contact(request: Request, db: Session = Depends(get_db), full_name: s
         return RedirectResponse('/admin/login', status_code=302)
     contact = Contact(full_name=full_name, department_id=department_id)
     db.add(contact)
-    db.commit()
+    adjust_department_counts(db, department_id, 1)
+    db.flush()
+    publish(db, 'contact', contact.id)
     log_action(db, user.id, 'create', 'contact', contact.id)
     return RedirectResponse('/admin/contacts', status_code=302)
 
@@ -208,12 +415,10 @@ def archive_contact(request: Request, contact_id: int, db: Session = Depends(get
     user = request.state.current_user
     if not user or user.role not in ['admin', 'editor']:
         return RedirectResponse('/admin/login', status_code=302)
-    contact = db.query(Contact).get(contact_id)
-    if contact:
-        contact.is_archived = True
-        db.commit()
-        log_action(db, user.id, 'archive', 'contact', contact.id)
-    return RedirectResponse('/admin/contacts', status_code=302)
+    if set_contact_archived(db, contact_id, True):
+        publish(db, 'contact', contact_id)
+        log_action(db, user.id, 'archive', 'contact', contact_id)
+    return contacts_redirect(request)
 
 
 @app.post('/admin/contacts/{contact_id}/restore')
@@ -221,12 +426,10 @@ def restore_contact(request: Request, contact_id: int, db: Session = Depends(get
     user = request.state.current_user
     if not user or user.role not in ['admin', 'editor']:
         return RedirectResponse('/admin/login', status_code=302)
-    contact = db.query(Contact).get(contact_id)
-    if contact:
-        contact.is_archived = False
-        db.commit()
-        log_action(db, user.id, 'restore', 'contact', contact.id)
-    return RedirectResponse('/admin/contacts', status_code=302)
+    if set_contact_archived(db, contact_id, False):
+        publish(db, 'contact', contact_id)
+        log_action(db, user.id, 'restore', 'contact', contact_id)
+    return contacts_redirect(request)
 
 
 @app.post('/admin/contacts/{contact_id}/phones')
@@ -240,26 +443,98 @@ def update_contact_phones(request: Request, contact_id: int, db: Session = Depen
     numbers = [n.strip() for n in phone_numbers.split('\n') if n.strip()]
     types = [t.strip() for t in phone_types.split('\n') if t.strip()]
     pairs = list(zip(types, numbers))
+    # Замена номеров — одна транзакция: при превышении лимита у контакта остаются прежние номера
     contact.phones.clear()
-    db.commit()
+    db.flush()
     for t, num in pairs:
         phone = db.query(Phone).filter_by(type=t, number=num).first()
         if not phone:
             phone = Phone(type=t, number=num)
             db.add(phone)
-            db.commit()
+            db.flush()
         ok, err = check_phone_limit(db, phone, [contact.id])
         if not ok:
-            return templates.TemplateResponse('admin/contacts.html', {'request': request, 'contacts': db.query(Contact).all(), 'departments': db.query(Department).all(), 'phones': db.query(Phone).all(), 'error': err}, status_code=400)
+            db.rollback()
+            return templates.TemplateResponse('admin/contacts.html', {'request': request, **contacts_page_context(db, **contacts_filters(request)), 'error': err}, status_code=400)
         db.add(ContactPhone(contact_id=contact.id, phone_id=phone.id))
-        db.commit()
+        db.flush()
+    publish(db, 'contact', contact.id)
     log_action(db, user.id, 'update_phones', 'contact', contact.id)
-    return RedirectResponse('/admin/contacts', status_code=302)
+    return contacts_redirect(request)
+
+
+BULK_ACTIONS = {'archive', 'restore', 'move'}
+
+
+def restore_limit_violations(db: Session, scope):
+    restoring = select(Contact.id).where(scope, Contact.is_archived == True)
+    limit = max_contacts_per_phone(db)
+    return db.query(Phone.number).join(ContactPhone).join(Contact).filter(
+        ContactPhone.phone_id.in_(select(ContactPhone.phone_id).where(ContactPhone.contact_id.in_(restoring))),
+        or_(Contact.is_archived == False, Contact.id.in_(restoring)),
+    ).group_by(Phone.id, Phone.number).having(func.count(ContactPhone.id) > limit).all()
+
+
+@app.post('/admin/contacts/bulk')
+def bulk_contacts(request: Request, db: Session = Depends(get_db), action: str = Form(...), dept_id: int | None = Form(None),
+                  contact_ids: list[int] = Form([]), target_dept_id: int | None = Form(None)):
+    user = request.state.current_user
+    if not user or user.role not in ['admin', 'editor']:
+        return RedirectResponse('/admin/login', status_code=302)
+
+    def fail(error: str):
+        return templates.TemplateResponse('admin/contacts.html', {'request': request, **contacts_page_context(db, **contacts_filters(request)), 'error': error}, status_code=400)
+
+    if action not in BULK_ACTIONS:
+        raise HTTPException(status_code=400)
+    if contact_ids:
+        scope = Contact.id.in_(contact_ids)
+    elif dept_id:
+        scope = Contact.department_id.in_(department_subtree_ids(db, dept_id))
+    else:
+        return fail('Не выбраны контакты или отдел')
+
+    if action == 'archive':
+        changed = Contact.is_archived == False
+        values = {'is_archived': True}
+    elif action == 'restore':
+        changed = Contact.is_archived == True
+        values = {'is_archived': False}
+        violations = restore_limit_violations(db, scope)
+        if violations:
+            limit = max_contacts_per_phone(db)
+            return fail(f"Лимит {limit} привязок превышен для номеров: {', '.join(v.number for v in violations)}")
+    else:
+        if not target_dept_id or not db.query(Department).get(target_dept_id):
+            return fail('Не выбран отдел для переноса')
+        changed = Contact.department_id != target_dept_id
+        values = {'department_id': target_dept_id}
+
+    # Старые отдел и статус возвращает сам UPDATE: строки блокируются в подзапросе,
+    # поэтому счётчики считаются ровно по тем строкам, которые он изменил
+    old = select(Contact.id, Contact.department_id, Contact.is_archived).where(scope, changed).with_for_update().subquery()
+    changed_rows = db.execute(
+        update(Contact)
+        .where(Contact.id == old.c.id)
+        .values(**values)
+        .returning(old.c.department_id, old.c.is_archived)
+        .execution_options(synchronize_session=False)
+    ).all()
+    deltas = Counter()
+    for old_dept_id, was_archived in changed_rows:
+        deltas[old_dept_id] -= int(not was_archived)
+        deltas[values.get('department_id', old_dept_id)] += int(not values.get('is_archived', was_archived))
+    for dept, delta in deltas.items():
+        adjust_department_counts(db, dept, delta)
+    diff = {'dept_id': dept_id, 'contact_ids': contact_ids, 'target_dept_id': target_dept_id, 'count': len(changed_rows)}
+    publish(db, 'contact')
+    log_action(db, user.id, f'bulk_{action}', 'contact', dept_id or 0, diff_json=json.dumps(diff, ensure_ascii=False))
+    return contacts_redirect(request)
 
 
 # Departments
 @app.get('/admin/departments', response_class=HTMLResponse)
-def departments_list(request: Request, db: Session = Depends(get_db)):
+def departments_list(request: Request, db: Session = Depends(get_read_db)):
     user = request.state.current_user
     if not user or user.role != 'admin':
         return RedirectResponse('/admin/login', status_code=302)
@@ -274,7 +549,8 @@ def create_department(request: Request, db: Session = Depends(get_db), name: str
         return RedirectResponse('/admin/login', status_code=302)
     dept = Department(name=name, parent_id=parent_id if parent_id else None)
     db.add(dept)
-    db.commit()
+    db.flush()
+    publish(db, 'department', dept.id)
     log_action(db, user.id, 'create', 'department', dept.id)
     return RedirectResponse('/admin/departments', status_code=302)
 
@@ -335,7 +611,7 @@ def update_settings(request: Request, db: Session = Depends(get_db), max_contact
         db.add(setting)
     else:
         setting.value = str(max_contacts_per_phone)
-    db.commit()
+    publish(db, 'setting')
     log_action(db, user.id, 'update', 'setting', 0)
     return RedirectResponse('/admin/settings', status_code=302)
 
@@ -359,7 +635,8 @@ def create_user(request: Request, db: Session = Depends(get_db), login: str = Fo
         return templates.TemplateResponse('admin/users.html', {'request': request, 'users': db.query(User).all(), 'error': 'Логин занят'}, status_code=400)
     new_user = User(login=login, password_hash=get_password_hash(password), role=role, is_active=True)
     db.add(new_user)
-    db.commit()
+    db.flush()
+    publish(db, 'user', new_user.id)
     log_action(db, user.id, 'create', 'user', new_user.id)
     return RedirectResponse('/admin/users', status_code=302)
 
@@ -372,7 +649,7 @@ def toggle_user(request: Request, user_id: int, db: Session = Depends(get_db)):
     u = db.query(User).get(user_id)
     if u:
         u.is_active = not u.is_active
-        db.commit()
+        publish(db, 'user', u.id)
         log_action(db, user.id, 'toggle', 'user', u.id)
     return RedirectResponse('/admin/users', status_code=302)
 
@@ -392,7 +669,9 @@ def export_data(request: Request, db: Session = Depends(get_db), fmt: str = Form
     if not user or user.role != 'admin':
         return RedirectResponse('/admin/login', status_code=302)
     rows = []
-    contacts = db.query(Contact).all()
+    # Все отделы в identity map, чтобы подъём по parent не ходил в БД
+    db.query(Department).all()
+    contacts = db.query(Contact).options(selectinload(Contact.phones).selectinload(ContactPhone.phone)).all()
     for c in contacts:
         city = ';'.join([cp.phone.number for cp in c.phones if cp.phone.type == 'city'])
         internal = ';'.join([cp.phone.number for cp in c.phones if cp.phone.type == 'internal'])
@@ -423,77 +702,129 @@ def import_data(request: Request, db: Session = Depends(get_db), file: UploadFil
     if not user or user.role != 'admin':
         return RedirectResponse('/admin/login', status_code=302)
     ext = os.path.splitext(file.filename)[1].lower()
-    if ext == '.csv':
-        df = pd.read_csv(file.file)
-    else:
-        df = pd.read_excel(file.file)
     errors = []
     created = 0
     updated = 0
-    for idx, row in df.iterrows():
-        dept_path = str(row.get('DepartmentPath', '')).strip()
-        full_name = row.get('FullName', '')
-        try:
-            archived = bool(int(row.get('Archived', 0)))
-        except Exception:
-            archived = False
-        if not dept_path or dept_path.lower() == 'nan':
-            path_parts = ['Импортированные']
-        else:
-            path_parts = [p.strip() for p in str(dept_path).split('/') if p.strip()]
-        parent = None
-        for part in path_parts:
-            parent_id = parent.id if parent else None
-            dept = db.query(Department).filter_by(name=part, parent_id=parent_id).first()
-            if not dept:
-                dept = Department(name=part, parent_id=parent_id)
-                db.add(dept)
-                db.commit()
-            parent = dept
-        department = parent
-        contact = db.query(Contact).filter(Contact.full_name == full_name, Contact.department_id == department.id).first()
-        is_new = False
-        if not contact:
-            contact = Contact(full_name=full_name, department=department)
-            db.add(contact)
-            db.commit()
-            is_new = True
-        contact.is_archived = archived
-        db.commit()
-        # Replace phones
-        contact.phones.clear()
-        db.commit()
-        for col, ptype in [('PhonesCity', 'city'), ('PhonesInternal', 'internal'), ('PhonesIP', 'ip')]:
-            nums = str(row.get(col, '')).split(';') if row.get(col) is not None else []
-            for num in nums:
-                num = str(num).strip()
-                if not num or num.lower() == 'nan':
-                    continue
+    for rows, chunk_errors in parse_import(file.file, ext):
+        errors.extend(chunk_errors)
+        for row in rows:
+            # Строка — savepoint: ошибка откатывает её целиком вместе со сдвигом счётчиков
+            savepoint = db.begin_nested()
+            parent = None
+            for part in row['path_parts']:
+                parent_id = parent.id if parent else None
+                dept = db.query(Department).filter_by(name=part, parent_id=parent_id).first()
+                if not dept:
+                    dept = Department(name=part, parent_id=parent_id)
+                    db.add(dept)
+                    db.flush()
+                parent = dept
+            department = parent
+            contact = db.query(Contact).filter(Contact.full_name == row['full_name'], Contact.department_id == department.id).first()
+            is_new = False
+            if not contact:
+                contact = Contact(full_name=row['full_name'], department=department, is_archived=row['archived'])
+                db.add(contact)
+                db.flush()
+                adjust_department_counts(db, department.id, int(not row['archived']))
+                is_new = True
+            else:
+                # Тот же условный UPDATE, что у архивации из админки: одновременное изменение не сдвинет счётчик дважды
+                set_contact_archived(db, contact.id, row['archived'])
+            # Replace phones
+            contact.phones.clear()
+            db.flush()
+            row_failed = False
+            for ptype, num in row['phones']:
                 phone = db.query(Phone).filter_by(type=ptype, number=num).first()
                 if not phone:
                     phone = Phone(type=ptype, number=num)
                     db.add(phone)
-                    db.commit()
+                    db.flush()
                 ok, err = check_phone_limit(db, phone, [contact.id])
                 if not ok:
-                    errors.append(f"Строка {idx+1}: {err}")
-                    db.rollback()
+                    errors.append(f"Строка {row['row']}: {err}")
+                    savepoint.rollback()
+                    row_failed = True
                     break
                 db.add(ContactPhone(contact_id=contact.id, phone_id=phone.id))
-                db.commit()
-        if errors:
-            continue
-        if is_new:
-            created += 1
-        else:
-            updated += 1
+                db.flush()
+            if row_failed:
+                continue
+            savepoint.commit()
+            if is_new:
+                created += 1
+            else:
+                updated += 1
+        # Строки чанка уже записаны в транзакцию — отпускаем объекты, чтобы память не росла с размером файла
+        db.expunge_all()
+    # Весь импорт — одна транзакция: контакты, счётчики отделов и одно NOTIFY фиксируются вместе
+    publish(db, 'import')
     log_action(db, user.id, 'import', 'contacts', 0, diff_json=f"created={created},updated={updated},errors={len(errors)}")
     return templates.TemplateResponse('admin/import_export.html', {'request': request, 'preview': {'created': created, 'updated': updated, 'errors': len(errors)}, 'errors': errors})
 
 
+# Duplicates
+@app.get('/admin/duplicates', response_class=HTMLResponse)
+def duplicates_page(request: Request, db: Session = Depends(get_db)):
+    # Отчёт кэшируется до следующей записи, поэтому строится с основной БД, а не с отстающей реплики
+    user = request.state.current_user
+    if not user or user.role not in ['admin', 'editor']:
+        return RedirectResponse('/admin/login', status_code=302)
+    pairs = duplicates_cache.get('report', lambda: find_duplicates(db))
+    return templates.TemplateResponse('admin/duplicates.html', {'request': request, 'pairs': pairs})
+
+
+@app.post('/admin/duplicates/merge')
+def merge_duplicates(request: Request, db: Session = Depends(get_db), keep_id: int = Form(...), drop_id: int = Form(...)):
+    user = request.state.current_user
+    if not user or user.role not in ['admin', 'editor']:
+        return RedirectResponse('/admin/login', status_code=302)
+
+    def fail(error: str):
+        db.rollback()
+        pairs = duplicates_cache.get('report', lambda: find_duplicates(db))
+        return templates.TemplateResponse('admin/duplicates.html', {'request': request, 'pairs': pairs, 'error': error}, status_code=400)
+
+    if keep_id == drop_id:
+        raise HTTPException(status_code=404)
+    # Обе строки блокируются в порядке id, чтобы встречные слияния одной пары не взаимоблокировались
+    locked = {c.id: c for c in db.query(Contact).filter(Contact.id.in_([keep_id, drop_id])).order_by(Contact.id).with_for_update()}
+    keep = locked.get(keep_id)
+    drop = locked.get(drop_id)
+    if not keep or not drop:
+        raise HTTPException(status_code=404)
+    if keep.is_archived:
+        return fail(f'Контакт «{keep.full_name}» в архиве — оставлять нужно активный')
+    # Отчёт мог устареть или дубль уже слит параллельно — повторно номера не переносим
+    if drop.is_archived:
+        return fail(f'Контакт «{drop.full_name}» уже в архиве — обновите отчёт')
+    # Дубль архивируется первым: его номера перестают считаться активными привязками,
+    # и лимит ниже проверяется так, будто номер уже перешёл к оставляемому контакту
+    set_contact_archived(db, drop.id, True)
+    kept_phones = select(ContactPhone.phone_id).where(ContactPhone.contact_id == keep.id)
+    moving = db.query(Phone).join(ContactPhone).filter(ContactPhone.contact_id == drop.id, ContactPhone.phone_id.not_in(kept_phones)).all()
+    for phone in moving:
+        ok, err = check_phone_limit(db, phone, [keep.id])
+        if not ok:
+            return fail(err)
+    # Номера, которые уже есть у оставляемого контакта, просто отвязываются от дубля
+    db.execute(
+        update(ContactPhone)
+        .where(ContactPhone.contact_id == drop.id, ContactPhone.phone_id.in_([p.id for p in moving]))
+        .values(contact_id=keep.id)
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(delete(ContactPhone).where(ContactPhone.contact_id == drop.id).execution_options(synchronize_session=False))
+    publish(db, 'contact', keep.id)
+    publish(db, 'contact', drop.id)
+    log_action(db, user.id, 'merge', 'contact', keep.id, diff_json=json.dumps({'drop_id': drop.id, 'moved_phones': len(moving)}))
+    return RedirectResponse('/admin/duplicates', status_code=302)
+
+
 # Audit log view
 @app.get('/admin/audit', response_class=HTMLResponse)
-def audit_page(request: Request, db: Session = Depends(get_db)):
+def audit_page(request: Request, db: Session = Depends(get_read_db)):
     user = request.state.current_user
     if not user or user.role != 'admin':
         return RedirectResponse('/admin/login', status_code=302)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, UniqueConstraint, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, UniqueConstraint, Index, Text, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -11,12 +11,16 @@ class Department(Base):
     name = Column(String(255), nullable=False)
     sort_order = Column(Integer, default=0)
     is_active = Column(Boolean, default=True)
+    contacts_count = Column(Integer, default=0, nullable=False)  # активные контакты отдела
+    subtree_contacts_count = Column(Integer, default=0, nullable=False)  # включая подотделы
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     parent = relationship('Department', remote_side=[id], backref='children')
     contacts = relationship('Contact', back_populates='department')
 
+    __table_args__ = (Index('ix_departments_parent_id', 'parent_id'),)
+
 
 class Contact(Base):
     __tablename__ = 'contacts'
@@ -30,6 +34,12 @@ class Contact(Base):
     department = relationship('Department', back_populates='contacts')
     phones = relationship('ContactPhone', back_populates='contact', cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index('ix_contacts_department_id', 'department_id', 'full_name'),
+        Index('ix_contacts_name_id', 'full_name', 'id'),
+        Index('ix_contacts_active_name_id', 'full_name', 'id', postgresql_where=text('is_archived = false')),
+    )
+
 
 class Phone(Base):
     __tablename__ = 'phones'
@@ -58,7 +68,10 @@ class ContactPhone(Base):
     contact = relationship('Contact', back_populates='phones')
     phone = relationship('Phone', back_populates='contacts')
 
-    __table_args__ = (UniqueConstraint('contact_id', 'phone_id', name='uq_contact_phone'),)
+    __table_args__ = (
+        UniqueConstraint('contact_id', 'phone_id', name='uq_contact_phone'),
+        Index('ix_contact_phones_phone_id', 'phone_id', 'contact_id'),
+    )
 
 
 class Banner(Base):
@@ -97,3 +110,5 @@ class AuditLog(Base):
     diff_json = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     ip = Column(String(50))
+
+    __table_args__ = (Index('ix_audit_log_created_at', 'created_at'),)
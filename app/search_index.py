@@ -0,0 +1,163 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.models import Contact, ContactPhone
+
+WORD_RE = re.compile(r'\w+')
+NON_DIGIT_RE = re.compile(r'\D')
+
+
+def normalize(text: str) -> str:
+    return (text or '').lower().replace('ё', 'е')
+
+
+def tokenize(text: str):
+    return WORD_RE.findall(normalize(text))
+
+
+def query_tokens(q: str):
+    # "123-45" ищем как номер целиком, а не как два отдельных токена
+    if q and not re.search(r'[^\d\s\-()+]', q):
+        digits = NON_DIGIT_RE.sub('', q)
+        return [digits] if digits else []
+    return tokenize(q)
+
+
+# Потолок работы на один запрос: столько ключей самого редкого слова просматриваем,
+# и до такого размера диапазона остальные слова проверяем через множество id
+SCAN_LIMIT = 20000
+
+
+def make_entry(contact_id: int, full_name: str, department: str, phones):
+    entry = {'id': contact_id, 'full_name': full_name, 'department': department, 'phones': phones}
+    tokens = set(tokenize(full_name)) | set(tokenize(department))
+    tokens |= {NON_DIGIT_RE.sub('', p['number']) for p in phones} - {''}
+    return entry, tokens
+
+
+def index_keys(entries):
+    # Внутри токена ключи упорядочены по ФИО — это и есть порядок выдачи
+    return [(t, normalize(entry['full_name']), cid) for cid, (entry, tokens) in entries.items() for t in tokens]
+
+
+class SuggestIndex:
+    # Отсортированный список (токен, ФИО, contact_id) + поиск по префиксу через bisect;
+    # _ids — те же contact_id отдельным списком, чтобы срез диапазона в set строился быстро.
+    # Запись копирует структуры и подменяет ссылки, поэтому чтение идёт без блокировок.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._ids = []
+        self._entries = {}
+        self.ready = False
+        self.built_at = 0.0
+        self._generation = 0
+
+    @staticmethod
+    def _load(db: Session, contact_ids=None):
+        query = db.query(Contact).options(
+            joinedload(Contact.department),
+            selectinload(Contact.phones).selectinload(ContactPhone.phone),
+        ).filter(Contact.is_archived == False)
+        if contact_ids is not None:
+            query = query.filter(Contact.id.in_(contact_ids))
+        result = {}
+        for c in query.all():
+            phones = [{'type': cp.phone.type, 'number': cp.phone.number} for cp in c.phones]
+            result[c.id] = make_entry(c.id, c.full_name, c.department.name, phones)
+        return result
+
+    def replace_all(self, entries):
+        keys = sorted(index_keys(entries))
+        with self._lock:
+            self._keys, self._ids, self._entries = keys, [k[2] for k in keys], entries
+            self.ready = True
+            self.built_at = time.monotonic()
+
+    def rebuild(self, db: Session):
+        with self._lock:
+            while True:
+                generation = self._generation
+                entries = self._load(db)
+                # Инвалидация во время загрузки: данные могли быть прочитаны до изменения — читаем заново
+                if generation == self._generation:
+                    self.replace_all(entries)
+                    return
+
+    def is_fresh(self, max_age: float | None) -> bool:
+        return self.ready and (max_age is None or time.monotonic() - self.built_at < max_age)
+
+    def ensure_ready(self, db: Session, max_age: float | None = None):
+        # Пересобирает один запрос. Остальные ждут его, только если отвечать пока нечем,
+        # иначе отвечают по прежним данным
+        if self.is_fresh(max_age):
+            return
+        if not self._lock.acquire(blocking=not self._keys):
+            return
+        try:
+            if not self.is_fresh(max_age):
+                self.rebuild(db)
+        finally:
+            self._lock.release()
+
+    def refresh_contacts(self, db: Session, contact_ids):
+        if not self.ready:
+            return
+        contact_ids = set(contact_ids)
+        fresh = self._load(db, contact_ids)
+        with self._lock:
+            entries = {cid: v for cid, v in self._entries.items() if cid not in contact_ids}
+            entries.update(fresh)
+            keys = [k for k in self._keys if k[2] not in contact_ids]
+            keys.extend(index_keys(fresh))
+            keys.sort()
+            self._keys, self._ids, self._entries = keys, [k[2] for k in keys], entries
+
+    def invalidate(self):
+        # Данные остаются до пересборки, чтобы подсказки не пропадали на время загрузки
+        self._generation += 1
+        self.ready = False
+
+    def suggest(self, q: str, limit: int = 10):
+        # Кандидаты берутся по самому редкому слову запроса. Его диапазон уже упорядочен:
+        # сначала точное совпадение слова (по ФИО), затем дополнения по алфавиту —
+        # поэтому просмотр останавливается на первых limit подходящих
+        tokens = query_tokens(q)
+        if not tokens:
+            return []
+        keys, ids, entries = self._keys, self._ids, self._entries
+        ranges = [(bisect_left(keys, (t,)), bisect_left(keys, (t + '\uffff',)), t) for t in tokens]
+        ranges.sort(key=lambda r: r[1] - r[0])
+        lo, hi, best = ranges[0]
+        # Остальные слова: небольшой диапазон превращаем в множество id, большой проверяем префиксом у кандидата
+        allowed = None
+        rest = []
+        for rlo, rhi, t in ranges[1:]:
+            if rhi - rlo <= SCAN_LIMIT:
+                matched = set(ids[rlo:rhi])
+                allowed = matched if allowed is None else allowed & matched
+            else:
+                rest.append(t)
+        stop = min(hi, lo + SCAN_LIMIT)
+        if allowed is None:
+            candidates = (ids[i] for i in range(lo, stop))
+        else:
+            candidates = [cid for cid in ids[lo:stop] if cid in allowed]
+        found = []
+        seen = set()
+        for cid in candidates:
+            if cid in seen or cid not in entries:
+                continue
+            seen.add(cid)
+            entry, entry_tokens = entries[cid]
+            if all(any(et.startswith(t) for et in entry_tokens) for t in rest):
+                found.append(entry)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pytest_configure(config):
+    # Без TEST_DATABASE_URL поднимаем временный PostgreSQL из пакета pgserver, если он установлен
+    if os.getenv('TEST_DATABASE_URL'):
+        return
+    try:
+        import pgserver
+    except ImportError:
+        return
+    server = pgserver.get_server(tempfile.mkdtemp(prefix='phone_directly_test_'), cleanup_mode='delete')
+    server.psql('CREATE DATABASE phone_directly_test;')
+    config._pgserver = server
+    os.environ['TEST_DATABASE_URL'] = server.get_uri('phone_directly_test')
+
+
+def pytest_unconfigure(config):
+    server = getattr(config, '_pgserver', None)
+    if server is not None:
+        server.cleanup()
+
+
+@pytest.fixture(scope='module')
+def fresh_schema():
+    # Каждый модуль начинает с пустой схемы, накатанной миграциями
+    from alembic import command
+    from alembic.config import Config
+    cfg = Config(os.path.join(ROOT, 'alembic.ini'))
+    cfg.set_main_option('script_location', os.path.join(ROOT, 'app', 'alembic'))
+    command.downgrade(cfg, 'base')
+    command.upgrade(cfg, 'head')
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason='TEST_DATABASE_URL не задан')
+if TEST_DATABASE_URL:
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    os.environ['CACHE_BUS_ENABLED'] = '0'
+
+
+@pytest.fixture(scope='module')
+def client(fresh_schema):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    client = TestClient(app)
+    response = client.post('/admin/login', data={'login': 'admin', 'password': 'admin123'}, follow_redirects=False)
+    assert response.status_code == 302
+    return client
+
+
+def test_filter_form_without_department(client):
+    # Так форму отправляет браузер при выбранном «Все отделы»
+    response = client.get('/admin/contacts', params={'q': '', 'dept_id': '', 'phone': '', 'status': 'active'})
+    assert response.status_code == 200
+    assert 'Иван Петров' in response.text
+    assert 'Мария Смирнова' in response.text
+
+
+def test_filter_by_department_subtree(client):
+    from app.database import SessionLocal
+    from app.models import Department
+    db = SessionLocal()
+    dev_id = db.query(Department.id).filter_by(name='Отдел разработки').scalar()
+    db.close()
+    response = client.get('/admin/contacts', params={'q': '', 'dept_id': str(dev_id), 'phone': '', 'status': 'active'})
+    assert response.status_code == 200
+    assert 'Мария Смирнова' in response.text
+    assert 'Иван Петров' not in response.text
+
+
+def test_first_page_link_keeps_filters(client):
+    response = client.get('/admin/contacts', params={'q': 'Мария', 'dept_id': '', 'after_name': 'А', 'after_id': '0'})
+    assert 'href="/admin/contacts?q=%D0%9C%D0%B0%D1%80%D0%B8%D1%8F&amp;status=active"' in response.text
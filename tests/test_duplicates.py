@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from app.duplicates import duplicate_pairs, name_key, trigrams
+
+
+def contact(cid, full_name, department_id=1):
+    return SimpleNamespace(id=cid, full_name=full_name, department_id=department_id)
+
+
+def pair_ids(pairs):
+    return {(p['a']['id'], p['b']['id']) for p in pairs}
+
+
+def test_name_key_ignores_word_order_case_and_yo():
+    assert name_key('Петров Пётр Иванович') == name_key('иванович ПЕТР петров')
+    assert name_key('Петров Пётр') == 'петр петров'
+
+
+def test_trigrams_are_padded():
+    assert trigrams('ab') == {'  a', ' ab', 'ab '}
+    assert trigrams('иван') == {'  и', ' ив', 'ива', 'ван', 'ан '}
+
+
+def test_reordered_names_are_duplicates():
+    pairs = duplicate_pairs([contact(1, 'Иван Петров'), contact(2, 'Петров Иван'), contact(3, 'Мария Смирнова')], {}, {1: 'Склад'})
+    assert pair_ids(pairs) == {(1, 2)}
+    assert pairs[0]['reasons'] == ['одинаковое ФИО']
+    assert pairs[0]['a']['department'] == 'Склад'
+
+
+def test_typo_is_found_by_minhash():
+    contacts = [contact(1, 'Константинопольский Александр Сергеевич'), contact(2, 'Константинопольский Алексндр Сергеевич')]
+    syllables = ['ба', 'ве', 'ги', 'до', 'жу', 'зя', 'ке', 'лу', 'ми', 'но', 'пы', 'ро', 'су', 'ти']
+    for i in range(200):
+        first = ''.join(syllables[(i * k) % len(syllables)] for k in (1, 3, 5))
+        last = ''.join(syllables[(i // len(syllables) + k * 7) % len(syllables)] for k in (2, 4, 6))
+        contacts.append(contact(10 + i, f'{first} {last}{i}'))
+    pairs = duplicate_pairs(contacts, {}, {})
+    assert (1, 2) in pair_ids(pairs)
+    assert {(a, b) for a, b in pair_ids(pairs) if a < 10 or b < 10} == {(1, 2)}
+
+
+def test_shared_phone_lowers_the_name_threshold():
+    contacts = [contact(1, 'Петров Иван'), contact(2, 'Петров Иван Сергеевич'), contact(3, 'Сидорова Анна')]
+    assert pair_ids(duplicate_pairs(contacts, {}, {})) == set()
+    pairs = duplicate_pairs(contacts, {1: {100}, 2: {100}, 3: {100}}, {})
+    assert pair_ids(pairs) == {(1, 2)}
+    assert 'общих номеров: 1' in pairs[0]['reasons']
+
+
+def test_unrelated_names_are_not_paired():
+    contacts = [contact(1, 'Иван Петров'), contact(2, 'Мария Смирнова'), contact(3, 'Олег Кузнецов')]
+    assert duplicate_pairs(contacts, {1: {1}, 2: {2}, 3: {3}}, {}) == []
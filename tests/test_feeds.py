@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+from app.feeds import CISCO_PAGE_SIZE, CiscoDirectory, build_feed
+
+
+def contact(i, *numbers):
+    phones = [SimpleNamespace(sort_order=n, phone=SimpleNamespace(type='internal', number=num)) for n, num in enumerate(numbers)]
+    return SimpleNamespace(full_name=f'Сотрудник {i}', phones=phones, department=SimpleNamespace(name='Склад'))
+
+
+def test_cisco_directory_is_paged():
+    directory = build_feed('cisco.xml', [contact(i, str(i)) for i in range(CISCO_PAGE_SIZE * 2 + 1)], 'Справочник')
+    assert isinstance(directory, CiscoDirectory)
+    assert len(directory.pages) == 3
+    first = directory.page(1, 'http://pbx/api/phonebook/cisco.xml?page=2').body.decode()
+    assert first.count('<DirectoryEntry>') == CISCO_PAGE_SIZE
+    assert '<URL>http://pbx/api/phonebook/cisco.xml?page=2</URL>' in first
+    last = directory.page(3, None).body.decode()
+    assert last.count('<DirectoryEntry>') == 1
+    assert '<SoftKeyItem>' not in last
+
+
+def test_cisco_page_is_built_once():
+    directory = CiscoDirectory([contact(1, '101')], 'Справочник')
+    assert directory.page(1, None) is directory.page(1, None)
+
+
+def test_gzip_and_plain_etags_differ():
+    feed = build_feed('yealink.xml', [contact(1, '101', '102')], 'Справочник')
+    assert feed.body.count(b'<Telephone>') == 2
+    assert feed.etag != feed.gzip_etag
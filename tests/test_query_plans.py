@@ -0,0 +1,147 @@
+import os
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+# База полностью пересоздаётся миграциями — указывайте только отдельную тестовую БД
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason='TEST_DATABASE_URL не задан')
+if TEST_DATABASE_URL:
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    os.environ['CACHE_BUS_ENABLED'] = '0'
+
+LARGE_TABLES = {'contacts', 'contact_phones', 'phones', 'audit_log'}
+ROWS = 50000
+
+SEED_SQL = [
+    "INSERT INTO departments (name, sort_order, is_active, contacts_count, subtree_contacts_count) "
+    "SELECT 'Отдел ' || g, g, true, 0, 0 FROM generate_series(1, 200) g",
+    "UPDATE departments SET parent_id = (id % 20) + 1 WHERE id > 20",
+    "INSERT INTO contacts (department_id, full_name, is_archived) "
+    f"SELECT (g % 200) + 1, 'Сотрудник ' || md5(g::text), g % 10 = 0 FROM generate_series(1, {ROWS}) g",
+    "INSERT INTO phones (type, number, is_active) "
+    f"SELECT 'internal', lpad(g::text, 6, '0'), true FROM generate_series(1, {ROWS}) g",
+    f"INSERT INTO contact_phones (contact_id, phone_id, sort_order) SELECT g, g, 0 FROM generate_series(1, {ROWS}) g",
+    "INSERT INTO audit_log (action, entity, entity_id, created_at) "
+    f"SELECT 'create', 'contact', g, now() - g * interval '1 minute' FROM generate_series(1, {ROWS}) g",
+    "INSERT INTO settings (key, value) VALUES ('max_contacts_per_phone', '2')",
+    "ANALYZE",
+]
+
+
+@pytest.fixture(scope='module')
+def db(fresh_schema):
+    from sqlalchemy import text
+    from app.database import SessionLocal
+    session = SessionLocal()
+    for sql in SEED_SQL:
+        session.execute(text(sql))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def request_obj():
+    from starlette.requests import Request
+    request = Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': [], 'query_string': b''})
+    request.state.current_user = SimpleNamespace(id=None, role='admin')
+    return request
+
+
+@contextmanager
+def captured_sql(db):
+    from sqlalchemy import event
+    engine = db.get_bind()
+    statements = []
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before)
+
+
+def walk(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk(child)
+
+
+def assert_no_seq_scans(db, statements, allow=()):
+    assert statements, 'ни одного запроса не перехвачено'
+    checked = set()
+    for statement, parameters in statements:
+        if statement in checked:
+            continue
+        checked.add(statement)
+        plan = db.connection().exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        for node in walk(plan[0]['Plan']):
+            relation = node.get('Relation Name')
+            if node['Node Type'] == 'Seq Scan' and relation in LARGE_TABLES - set(allow):
+                pytest.fail(f'Seq Scan по {relation}:\n{statement[:500]}')
+
+
+def has_index(db, name):
+    from sqlalchemy import text
+    return db.execute(text('SELECT 1 FROM pg_indexes WHERE indexname = :name'), {'name': name}).scalar() is not None
+
+
+def test_public_index_by_department(db, request_obj):
+    from app.main import public_index
+    with captured_sql(db) as statements:
+        public_index(request_obj, db, dept_id=150, q=None)
+    assert_no_seq_scans(db, statements)
+
+
+def test_public_index_search(db, request_obj):
+    if not has_index(db, 'ix_contacts_full_name_trgm'):
+        pytest.skip('pg_trgm недоступен')
+    from app.main import public_index
+    with captured_sql(db) as statements:
+        public_index(request_obj, db, dept_id=None, q='c4ca4238')
+    assert_no_seq_scans(db, statements)
+
+
+def test_check_phone_limit(db):
+    from app.main import check_phone_limit
+    from app.models import Phone
+    phone = db.query(Phone).filter_by(type='internal', number='012345').first()
+    with captured_sql(db) as statements:
+        check_phone_limit(db, phone, [1])
+    assert_no_seq_scans(db, statements)
+
+
+def test_contacts_list_first_page(db, request_obj):
+    from app.main import contacts_list
+    with captured_sql(db) as statements:
+        contacts_list(request_obj, db)
+    assert_no_seq_scans(db, statements)
+
+
+def test_contacts_list_keyset_page_in_department(db, request_obj):
+    from app.main import contacts_list
+    with captured_sql(db) as statements:
+        contacts_list(request_obj, db, dept_id=5, status='all', after_name='Сотрудник 8', after_id=1)
+    assert_no_seq_scans(db, statements)
+
+
+def test_export_data(db, request_obj):
+    from app.main import export_data
+    with captured_sql(db) as statements:
+        export_data(request_obj, db, fmt='csv')
+    # Экспорт читает все контакты, но телефоны должны подгружаться пачками по индексу, а не по одному
+    assert len(statements) < ROWS / 100
+    assert_no_seq_scans(db, statements, allow={'contacts'})
+
+
+def test_audit_page(db, request_obj):
+    from app.main import audit_page
+    with captured_sql(db) as statements:
+        audit_page(request_obj, db)
+    assert_no_seq_scans(db, statements)
@@ -0,0 +1,86 @@
+from app.search_index import SuggestIndex, make_entry, query_tokens, tokenize
+
+
+def build(contacts):
+    index = SuggestIndex()
+    index.replace_all({cid: make_entry(cid, name, dept, phones) for cid, name, dept, phones in contacts})
+    return index
+
+
+def names(results):
+    return [r['full_name'] for r in results]
+
+
+def test_query_tokens_words():
+    assert query_tokens('Пётр  ИВАНОВ') == ['петр', 'иванов']
+    assert tokenize('Отдел-разработки, 2') == ['отдел', 'разработки', '2']
+
+
+def test_query_tokens_phone_number_is_one_token():
+    assert query_tokens('+7 (495) 123-45-67') == ['74951234567']
+    assert query_tokens('123-45') == ['12345']
+    assert query_tokens('') == []
+    assert query_tokens('---') == []
+
+
+def test_prefix_match_by_name_department_and_phone():
+    index = build([
+        (1, 'Иван Петров', 'Бухгалтерия', [{'type': 'city', 'number': '123-45-67'}]),
+        (2, 'Мария Смирнова', 'Отдел разработки', [{'type': 'internal', 'number': '101'}]),
+    ])
+    assert names(index.suggest('пет')) == ['Иван Петров']
+    assert names(index.suggest('разраб')) == ['Мария Смирнова']
+    assert names(index.suggest('123-4')) == ['Иван Петров']
+    assert names(index.suggest('10')) == ['Мария Смирнова']
+    assert index.suggest('сидор') == []
+
+
+def test_all_query_words_must_match():
+    index = build([
+        (1, 'Иван Петров', 'Бухгалтерия', []),
+        (2, 'Иван Сидоров', 'Бухгалтерия', []),
+    ])
+    assert names(index.suggest('иван сид')) == ['Иван Сидоров']
+    assert names(index.suggest('сид иван')) == ['Иван Сидоров']
+
+
+def test_exact_word_ranks_before_longer_words():
+    index = build([
+        (1, 'Ивакин Пётр', 'Склад', []),
+        (2, 'Иванов Сергей', 'Склад', []),
+        (3, 'Петров Иван', 'Склад', []),
+        (4, 'Иван Сидоров', 'Склад', []),
+    ])
+    assert names(index.suggest('иван')) == ['Иван Сидоров', 'Петров Иван', 'Иванов Сергей']
+    assert names(index.suggest('ива')) == ['Ивакин Пётр', 'Иван Сидоров', 'Петров Иван', 'Иванов Сергей']
+
+
+def test_limit_stops_early_on_common_word():
+    index = build([(cid, f'Сотрудник {cid:05d}', 'Отдел продаж', []) for cid in range(1, 20001)])
+    assert names(index.suggest('отдел', limit=3)) == ['Сотрудник 00001', 'Сотрудник 00002', 'Сотрудник 00003']
+    assert len(index.suggest('о', limit=10)) == 10
+
+
+def test_refresh_replaces_contact_keys():
+    index = build([(1, 'Иван Петров', 'Склад', []), (2, 'Мария Смирнова', 'Склад', [])])
+
+    class Db:
+        pass
+
+    index._load = lambda db, contact_ids=None: {1: make_entry(1, 'Иван Сидоров', 'Склад', [])}
+    index.refresh_contacts(Db(), [1])
+    assert index.suggest('петров') == []
+    assert names(index.suggest('сидоров')) == ['Иван Сидоров']
+    assert names(index.suggest('смирн')) == ['Мария Смирнова']
+
+
+def test_invalidate_keeps_serving_until_rebuild():
+    index = build([(1, 'Иван Петров', 'Склад', [])])
+    index.invalidate()
+    assert not index.ready
+    assert names(index.suggest('иван')) == ['Иван Петров']
+    index._load = lambda db, contact_ids=None: {2: make_entry(2, 'Мария Смирнова', 'Склад', [])}
+    index.ensure_ready(None)
+    assert index.ready
+    assert index.suggest('иван') == []
+    assert names(index.suggest('мария')) == ['Мария Смирнова']